@@ -3,26 +3,197 @@ Bot Manager - Handles bot registration, status tracking, and health monitoring
 """
 
 import asyncio
+import heapq
 import logging
+import time
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from itertools import count
+from operator import attrgetter, itemgetter
+from typing import Dict, List, Optional, Set, Tuple
 
-from pydantic import BaseModel
+import orjson
 
+class BotStatus:
+    """In-memory status record for a single bot.
 
-class BotStatus(BaseModel):
-    bot_id: str
-    display_name: Optional[str] = None  # Custom display name for the bot
-    mac_address: Optional[str] = None  # MAC address of the bot
-    last_seen: datetime
-    status: str
-    battery_level: Optional[float] = None
-    wifi_signal: Optional[int] = None
-    location: Optional[Dict[str, float]] = None
-    sensor_data: Optional[Dict] = None
-    uptime_seconds: Optional[int] = None
-    connection_count: int = 0
-    first_seen: datetime
+    A plain ``__slots__`` class rather than a pydantic model: the registry is
+    updated on every status packet and never validated or serialized through
+    pydantic, so per-assignment validation and a per-instance ``__dict__`` are
+    pure overhead.
+    """
+
+    __slots__ = (
+        "bot_id",
+        "display_name",  # Custom display name for the bot
+        "mac_address",  # MAC address of the bot
+        "last_seen",
+        "last_seen_mono",  # time.monotonic() at last_seen, for freshness checks
+        "last_seen_iso",  # last_seen.isoformat(), cached for API payloads
+        "status",
+        "battery_level",
+        "wifi_signal",
+        "location",
+        "sensor_data",
+        "uptime_seconds",
+        "connection_count",
+        "first_seen",
+        "first_seen_iso",
+        "_api_view",  # Cached payload dicts, rebuilt after the next mutation
+        "_node_view",
+        "_api_json",
+    )
+
+    def __init__(
+        self,
+        bot_id: str,
+        last_seen: datetime,
+        status: str,
+        first_seen: datetime,
+        display_name: Optional[str] = None,
+        mac_address: Optional[str] = None,
+        battery_level: Optional[float] = None,
+        wifi_signal: Optional[int] = None,
+        location: Optional[Dict[str, float]] = None,
+        sensor_data: Optional[Dict] = None,
+        uptime_seconds: Optional[int] = None,
+        connection_count: int = 0,
+    ):
+        self.bot_id = bot_id
+        self.display_name = display_name
+        self.mac_address = mac_address
+        self.last_seen = last_seen
+        self.last_seen_mono = time.monotonic()
+        self.last_seen_iso = last_seen.isoformat()
+        self.status = status
+        self.battery_level = battery_level
+        self.wifi_signal = wifi_signal
+        self.location = location
+        self.sensor_data = sensor_data
+        self.uptime_seconds = uptime_seconds
+        self.connection_count = connection_count
+        self.first_seen = first_seen
+        # Newly registered bots share one timestamp for both fields
+        self.first_seen_iso = self.last_seen_iso if first_seen is last_seen else first_seen.isoformat()
+        self._api_view = None
+        self._node_view = None
+        self._api_json = None
+
+    def invalidate_views(self) -> None:
+        """Drop the cached payload dicts; call after mutating any field"""
+        self._api_view = None
+        self._node_view = None
+        self._api_json = None
+
+    def api_view(self) -> Dict:
+        """Return the cached get_all_bots entry for this bot.
+
+        The time-dependent keys (status, time_since_last_seen, is_active) are
+        placeholders that callers override per request.
+        """
+        view = self._api_view
+        if view is None:
+            view = self._api_view = {
+                "bot_id": self.bot_id,
+                "display_name": self.display_name,
+                "status": self.status,
+                "last_seen": self.last_seen_iso,
+                "first_seen": self.first_seen_iso,
+                "battery_level": self.battery_level,
+                "wifi_signal": self.wifi_signal,
+                "location": self.location,
+                "sensor_data": self.sensor_data,
+                "uptime_seconds": self.uptime_seconds,
+                "connection_count": self.connection_count,
+                "time_since_last_seen": 0,
+                "is_active": True
+            }
+        return view
+
+    def api_json(self) -> bytes:
+        """Return the cached JSON encoding of the time-invariant api_view keys.
+
+        The object is left open (no closing brace) so get_all_bots_json can
+        append the per-request keys without re-encoding location/sensor_data.
+        """
+        fragment = self._api_json
+        if fragment is None:
+            fragment = self._api_json = orjson.dumps({
+                "bot_id": self.bot_id,
+                "display_name": self.display_name,
+                "last_seen": self.last_seen_iso,
+                "first_seen": self.first_seen_iso,
+                "battery_level": self.battery_level,
+                "wifi_signal": self.wifi_signal,
+                "location": self.location,
+                "sensor_data": self.sensor_data,
+                "uptime_seconds": self.uptime_seconds,
+                "connection_count": self.connection_count
+            })[:-1]
+        return fragment
+
+    def node_view(self) -> Dict:
+        """Return the cached network topology node for this bot; status is overridden per request"""
+        view = self._node_view
+        if view is None:
+            view = self._node_view = {
+                "id": self.bot_id,
+                "type": "bot",
+                "label": self.bot_id,
+                "status": "active",
+                "battery_level": self.battery_level,
+                "wifi_signal": self.wifi_signal
+            }
+        return view
+
+    def to_dict(self) -> Dict:
+        """Return a JSON-serializable view of the bot"""
+        return {
+            "bot_id": self.bot_id,
+            "display_name": self.display_name,
+            "mac_address": self.mac_address,
+            "status": self.status,
+            "last_seen": self.last_seen_iso,
+            "first_seen": self.first_seen_iso,
+            "battery_level": self.battery_level,
+            "wifi_signal": self.wifi_signal,
+            "location": self.location,
+            "sensor_data": self.sensor_data,
+            "uptime_seconds": self.uptime_seconds,
+            "connection_count": self.connection_count,
+        }
+
+
+# Fields a status update only overwrites when the packet carries a value
+_OPTIONAL_FIELDS = (
+    "battery_level",
+    "wifi_signal",
+    "mac_address",
+    "location",
+    "sensor_data",
+    "uptime_seconds",
+)
+
+
+def _build_apply_updates():
+    """Generate a straight-line updater for _OPTIONAL_FIELDS.
+
+    The generated function is the unrolled form of a getattr/setattr loop
+    over the field names, so the per-update cost stays that of hand-written
+    attribute access while the field list lives in one place.
+    """
+    lines = ["def _apply_updates(bot, bot_data):"]
+    for field in _OPTIONAL_FIELDS:
+        lines += [
+            f"    value = bot_data.{field}",
+            "    if value is not None:",
+            f"        bot.{field} = value",
+        ]
+    namespace = {}
+    exec("\n".join(lines), namespace)
+    return namespace["_apply_updates"]
+
+
+_apply_updates = _build_apply_updates()
 
 
 class BotManager:
@@ -32,6 +203,95 @@ class BotManager:
         self.logger = logging.getLogger(__name__)
         self.bot_timeout = config.get("monitoring", {}).get("bot_timeout_seconds", 30)
 
+        # Bots updated within bot_timeout, as of the last health check. This is
+        # the single source of truth for "active", and the running totals
+        # below cover exactly these bots so get_bot_statistics never rescans
+        self._active: Set[str] = set()
+        self._sum_battery = 0.0
+        self._count_battery = 0
+        self._low_battery_count = 0
+        self._sum_wifi = 0.0
+        self._count_wifi = 0
+
+        # Expiry heaps of (last_seen_mono, bot_id, version) so timeout sweeps only
+        # touch bots that are actually expiring. Every update pushes a fresh
+        # entry and bumps the bot's version; entries whose version no longer
+        # matches are stale and dropped when popped. Bots that check_bot_health
+        # has marked inactive move to the idle heap for the remove_* sweeps.
+        self._expiry_heap: List[Tuple[float, str, int]] = []
+        self._idle_heap: List[Tuple[float, str, int]] = []
+        self._bot_version: Dict[str, int] = {}
+        self._version_counter = count()
+
+    def _track_expiry(self, bot: BotStatus) -> None:
+        """Push a fresh expiry entry for a bot, superseding its previous one"""
+        version = next(self._version_counter)
+        self._bot_version[bot.bot_id] = version
+        heapq.heappush(self._expiry_heap, (bot.last_seen_mono, bot.bot_id, version))
+
+    def _count_bot(self, bot: BotStatus, sign: int) -> None:
+        """Add (sign=1) or remove (sign=-1) a bot's readings from the running totals"""
+        if bot.battery_level is not None:
+            self._sum_battery += sign * bot.battery_level
+            self._count_battery += sign
+            if bot.battery_level < 20:
+                self._low_battery_count += sign
+        if bot.wifi_signal is not None:
+            self._sum_wifi += sign * bot.wifi_signal
+            self._count_wifi += sign
+
+        # Reset the sums whenever they empty so float drift cannot build up
+        if not self._count_battery:
+            self._sum_battery = 0.0
+        if not self._count_wifi:
+            self._sum_wifi = 0.0
+
+    def _deactivate(self, bot: BotStatus) -> None:
+        """Remove a bot from the active set and the running totals"""
+        if bot.bot_id in self._active:
+            self._active.discard(bot.bot_id)
+            self._count_bot(bot, -1)
+
+    def _drop_bots(self, bot_ids: List[str]) -> None:
+        """Remove bots from the registry"""
+        for bot_id in bot_ids:
+            self._deactivate(self.bots[bot_id])
+            del self._bot_version[bot_id]
+
+        if len(bot_ids) > len(self.bots) // 2:
+            # Mass expiry: rebuilding the dict is a single pass and leaves it
+            # compact, where popping most keys would keep the old table size
+            removed = set(bot_ids)
+            self.bots = {bot_id: bot for bot_id, bot in self.bots.items() if bot_id not in removed}
+        else:
+            for bot_id in bot_ids:
+                del self.bots[bot_id]
+
+    def _pop_expired(self, heap: List[Tuple[float, str, int]], cutoff: float) -> List[Tuple[float, str, int]]:
+        """Pop current heap entries last seen before cutoff, discarding stale ones"""
+        expired = []
+        while heap and heap[0][0] < cutoff:
+            entry = heapq.heappop(heap)
+            if self._bot_version.get(entry[1]) == entry[2]:
+                expired.append(entry)
+        return expired
+
+    def _pop_removable(self, cutoff: float) -> List[str]:
+        """Pop the IDs of all bots last seen before cutoff from both expiry heaps"""
+        expired = self._pop_expired(self._idle_heap, cutoff)
+        expired += self._pop_expired(self._expiry_heap, cutoff)
+
+        # Bots that came back after going idle leave stale idle entries behind;
+        # compact the heap once those outnumber the registry
+        if len(self._idle_heap) > 2 * len(self.bots) + 64:
+            self._idle_heap = [
+                entry for entry in self._idle_heap
+                if self._bot_version.get(entry[1]) == entry[2]
+            ]
+            heapq.heapify(self._idle_heap)
+
+        return [bot_id for _, bot_id, _ in expired]
+
     async def update_bot_status(self, bot_data) -> None:
         """Update bot status with new data"""
         bot_id = bot_data.bot_id
@@ -40,28 +300,24 @@ class BotManager:
         if bot_id in self.bots:
             # Update existing bot
             bot = self.bots[bot_id]
+            self._deactivate(bot)
             bot.last_seen = current_time
+            bot.last_seen_mono = time.monotonic()
+            bot.last_seen_iso = current_time.isoformat()
             bot.status = bot_data.status
             bot.connection_count += 1
             
             # Update optional fields if provided
-            if bot_data.battery_level is not None:
-                bot.battery_level = bot_data.battery_level
-            if bot_data.wifi_signal is not None:
-                bot.wifi_signal = bot_data.wifi_signal
-            if bot_data.mac_address is not None:
-                bot.mac_address = bot_data.mac_address
-            if bot_data.location is not None:
-                bot.location = bot_data.location
-            if bot_data.sensor_data is not None:
-                bot.sensor_data = bot_data.sensor_data
-            if bot_data.uptime_seconds is not None:
-                bot.uptime_seconds = bot_data.uptime_seconds
-                
-            self.logger.debug(f"Updated bot {bot_id} status to {bot_data.status}")
+            _apply_updates(bot, bot_data)
+            bot.invalidate_views()
+
+            # Hottest path in the manager: skip building the record entirely
+            # unless debug logging is on
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug("Updated bot %s status to %s", bot_id, bot_data.status)
         else:
             # Register new bot
-            self.bots[bot_id] = BotStatus(
+            bot = self.bots[bot_id] = BotStatus(
                 bot_id=bot_id,
                 mac_address=bot_data.mac_address,
                 first_seen=current_time,
@@ -74,7 +330,11 @@ class BotManager:
                 uptime_seconds=bot_data.uptime_seconds,
                 connection_count=1
             )
-            self.logger.info(f"Registered new bot: {bot_id}")
+            self.logger.info("Registered new bot: %s", bot_id)
+
+        self._active.add(bot_id)
+        self._count_bot(bot, 1)
+        self._track_expiry(bot)
 
     async def get_bot(self, bot_id: str) -> Optional[BotStatus]:
         """Get bot status by ID"""
@@ -85,147 +345,128 @@ class BotManager:
         if bot_id not in self.bots:
             return False
         
-        self.bots[bot_id].display_name = new_name
-        self.logger.info(f"Updated bot {bot_id} display name to: {new_name}")
+        bot = self.bots[bot_id]
+        bot.display_name = new_name
+        bot.invalidate_views()
+        self.logger.info("Updated bot %s display name to: %s", bot_id, new_name)
         return True
 
     async def get_all_bots(self) -> List[Dict]:
         """Get all registered bots with their status"""
-        current_time = datetime.now()
-        bot_list = []
+        now = time.monotonic()
+        active = self._active
         
-        for bot_id, bot in self.bots.items():
-            # Calculate time since last seen
-            time_since_last_seen = (current_time - bot.last_seen).total_seconds()
-            
-            # Determine if bot is active
-            is_active = time_since_last_seen <= self.bot_timeout
-            
-            bot_info = {
-                "bot_id": bot.bot_id,
-                "display_name": bot.display_name,
+        # Copy each cached view, patching only the time-dependent keys (which
+        # keep their positions in the copy)
+        bot_list = [
+            {
+                **bot.api_view(),
                 "status": bot.status if is_active else "inactive",
-                "last_seen": bot.last_seen.isoformat(),
-                "first_seen": bot.first_seen.isoformat(),
-                "battery_level": bot.battery_level,
-                "wifi_signal": bot.wifi_signal,
-                "location": bot.location,
-                "sensor_data": bot.sensor_data,
-                "uptime_seconds": bot.uptime_seconds,
-                "connection_count": bot.connection_count,
-                "time_since_last_seen": int(time_since_last_seen),
+                "time_since_last_seen": int(now - bot.last_seen_mono),
                 "is_active": is_active
             }
-            bot_list.append(bot_info)
+            for bot in self.bots.values()
+            for is_active in (bot.bot_id in active,)
+        ]
         
         # Sort by last seen (most recent first)
-        bot_list.sort(key=lambda x: x["last_seen"], reverse=True)
+        bot_list.sort(key=itemgetter("last_seen"), reverse=True)
         return bot_list
 
+    async def get_all_bots_json(self) -> bytes:
+        """Get all registered bots as the JSON encoding of get_all_bots()"""
+        now = time.monotonic()
+        active = self._active
+        parts = []
+        
+        for bot in sorted(self.bots.values(), key=attrgetter("last_seen_iso"), reverse=True):
+            is_active = bot.bot_id in active
+            parts.append(b'%s,"status":%s,"time_since_last_seen":%d,"is_active":%s}' % (
+                bot.api_json(),
+                orjson.dumps(bot.status if is_active else "inactive"),
+                now - bot.last_seen_mono,
+                b"true" if is_active else b"false"
+            ))
+        
+        return b"[" + b",".join(parts) + b"]"
+
     async def check_bot_health(self) -> List[str]:
         """Check bot health and return list of inactive bot IDs"""
-        current_time = datetime.now()
+        now = time.monotonic()
+        bots = self.bots
+        idle_heap = self._idle_heap
         inactive_bots = []
         
-        for bot_id, bot in self.bots.items():
-            time_since_last_seen = (current_time - bot.last_seen).total_seconds()
+        for entry in self._pop_expired(self._expiry_heap, now - self.bot_timeout):
+            last_seen_mono, bot_id, _ = entry
+            heapq.heappush(idle_heap, entry)
             
-            if time_since_last_seen > self.bot_timeout and bot.status != "inactive":
+            bot = bots[bot_id]
+            self._deactivate(bot)
+            if bot.status != "inactive":
                 bot.status = "inactive"
+                bot.invalidate_views()
                 inactive_bots.append(bot_id)
                 self.logger.warning(
-                    f"Bot {bot_id} marked as inactive "
-                    f"(last seen {int(time_since_last_seen)}s ago)"
+                    "Bot %s marked as inactive (last seen %ds ago)",
+                    bot_id, now - last_seen_mono
                 )
         
         return inactive_bots
 
     async def get_bot_statistics(self) -> Dict:
         """Get overall bot network statistics"""
-        current_time = datetime.now()
         total_bots = len(self.bots)
-        active_bots = 0
-        inactive_bots = 0
-        
-        battery_levels = []
-        wifi_signals = []
-        
-        for bot in self.bots.values():
-            time_since_last_seen = (current_time - bot.last_seen).total_seconds()
-            
-            if time_since_last_seen <= self.bot_timeout:
-                active_bots += 1
-                
-                if bot.battery_level is not None:
-                    battery_levels.append(bot.battery_level)
-                if bot.wifi_signal is not None:
-                    wifi_signals.append(bot.wifi_signal)
-            else:
-                inactive_bots += 1
+        active_bots = len(self._active)
         
         stats = {
             "total_bots": total_bots,
             "active_bots": active_bots,
-            "inactive_bots": inactive_bots,
+            "inactive_bots": total_bots - active_bots,
             "activity_rate": (active_bots / total_bots * 100) if total_bots > 0 else 0,
-            "average_battery": sum(battery_levels) / len(battery_levels) if battery_levels else None,
-            "average_wifi_signal": sum(wifi_signals) / len(wifi_signals) if wifi_signals else None,
-            "low_battery_count": sum(1 for level in battery_levels if level < 20) if battery_levels else 0
+            "average_battery": self._sum_battery / self._count_battery if self._count_battery else None,
+            "average_wifi_signal": self._sum_wifi / self._count_wifi if self._count_wifi else None,
+            "low_battery_count": self._low_battery_count
         }
         
         return stats
 
     async def remove_old_bots(self, max_age_days: int = 7) -> int:
         """Remove bots that haven't been seen for a long time"""
-        cutoff_time = datetime.now() - timedelta(days=max_age_days)
-        removed_count = 0
-        
-        bots_to_remove = [
-            bot_id for bot_id, bot in self.bots.items()
-            if bot.last_seen < cutoff_time
-        ]
+        cutoff = time.monotonic() - timedelta(days=max_age_days).total_seconds()
+        bots_to_remove = self._pop_removable(cutoff)
+        self._drop_bots(bots_to_remove)
         
         for bot_id in bots_to_remove:
-            del self.bots[bot_id]
-            removed_count += 1
-            self.logger.info(f"Removed old bot: {bot_id}")
+            self.logger.info("Removed old bot: %s", bot_id)
         
-        return removed_count
+        return len(bots_to_remove)
 
     async def remove_inactive_bots(self, max_inactive_minutes: int = 5) -> int:
         """Remove bots that have been inactive for a specified time"""
-        current_time = datetime.now()
-        cutoff_time = current_time - timedelta(minutes=max_inactive_minutes)
-        removed_count = 0
-        
-        bots_to_remove = []
-        for bot_id, bot in self.bots.items():
-            time_since_last_seen = (current_time - bot.last_seen).total_seconds()
-            if time_since_last_seen > (max_inactive_minutes * 60):
-                bots_to_remove.append(bot_id)
+        cutoff = time.monotonic() - max_inactive_minutes * 60
+        bots_to_remove = self._pop_removable(cutoff)
+        self._drop_bots(bots_to_remove)
         
         for bot_id in bots_to_remove:
-            del self.bots[bot_id]
-            removed_count += 1
-            self.logger.info(f"Removed inactive bot: {bot_id}")
+            self.logger.info("Removed inactive bot: %s", bot_id)
         
-        return removed_count
+        return len(bots_to_remove)
 
     async def get_bot_locations(self) -> List[Dict]:
         """Get locations of all bots that have location data"""
+        active = self._active
         locations = []
         
         for bot in self.bots.values():
             if bot.location:
-                current_time = datetime.now()
-                time_since_last_seen = (current_time - bot.last_seen).total_seconds()
-                is_active = time_since_last_seen <= self.bot_timeout
+                is_active = bot.bot_id in active
                 
                 location_info = {
                     "bot_id": bot.bot_id,
                     "location": bot.location,
                     "status": bot.status if is_active else "inactive",
-                    "last_seen": bot.last_seen.isoformat(),
+                    "last_seen": bot.last_seen_iso,
                     "is_active": is_active
                 }
                 locations.append(location_info)
@@ -237,6 +478,8 @@ class BotManager:
         Generate network topology data for visualization
         This would be enhanced with actual ESP-NOW communication data
         """
+        current_time = datetime.now()
+        active = self._active
         nodes = []
         edges = []
         
@@ -250,17 +493,11 @@ class BotManager:
         
         # Add bot nodes
         for bot in self.bots.values():
-            current_time = datetime.now()
-            time_since_last_seen = (current_time - bot.last_seen).total_seconds()
-            is_active = time_since_last_seen <= self.bot_timeout
+            is_active = bot.bot_id in active
             
             nodes.append({
-                "id": bot.bot_id,
-                "type": "bot",
-                "label": bot.bot_id,
-                "status": "active" if is_active else "inactive",
-                "battery_level": bot.battery_level,
-                "wifi_signal": bot.wifi_signal
+                **bot.node_view(),
+                "status": "active" if is_active else "inactive"
             })
             
             # Add edge from bot to MCP (WiFi connection)
@@ -274,5 +511,5 @@ class BotManager:
         return {
             "nodes": nodes,
             "edges": edges,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": current_time.isoformat()
         }
\ No newline at end of file
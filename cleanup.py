@@ -6,74 +6,86 @@ Removes build artifacts and temporary files
 
 import os
 import shutil
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
+# Directories removed wherever they appear in the tree
+CLEANUP_DIR_NAMES = {
+    # Python cache
+    "__pycache__",
+
+    # PlatformIO build directories
+    ".pio",
+    ".pioenvs",
+    ".piolibdeps",
+}
+
+# Files removed by exact name
+CLEANUP_FILE_NAMES = {
+    ".Python",
+}
+
+# Files removed by suffix
+CLEANUP_FILE_SUFFIXES = (
+    # Python bytecode
+    ".pyc",
+    ".pyo",
+    ".pyd",
+
+    # Temporary files
+    ".tmp",
+    ".temp",
+    ".log~",
+)
+
+
+def _find_cleanup_targets(project_root: Path):
+    """Walk the tree once, yielding (path, is_dir) for everything to remove"""
+    for root, dirs, files in os.walk(project_root):
+        matched_dirs = [name for name in dirs if name in CLEANUP_DIR_NAMES]
+        for name in matched_dirs:
+            # Prune in place so the walk never descends into removed trees
+            dirs.remove(name)
+            yield Path(root) / name, True
+
+        for name in files:
+            if name in CLEANUP_FILE_NAMES or name.endswith(CLEANUP_FILE_SUFFIXES):
+                yield Path(root) / name, False
+
+
+def _remove(path: Path, is_dir: bool) -> None:
+    if is_dir:
+        shutil.rmtree(path)
+    else:
+        path.unlink()
+
+
 def cleanup_project():
     """Clean up the MCP project directory"""
     project_root = Path(__file__).parent
-    
+
     print("🧹 Cleaning up MCP project...")
-    
-    # Patterns to clean
-    cleanup_patterns = [
-        # Python cache
-        "__pycache__",
-        "*.pyc",
-        "*.pyo",
-        "*.pyd",
-        ".Python",
-        
-        # PlatformIO build directories
-        ".pio",
-        ".pioenvs",
-        ".piolibdeps",
-        
-        # IDE files
-        ".vscode/c_cpp_properties.json",
-        ".vscode/launch.json",
-        
-        # Temporary files
-        "*.tmp",
-        "*.temp",
-        "*.log~",
-    ]
-    
-    # Directories to clean
-    directories_to_clean = [
-        project_root / "__pycache__",
-        project_root / "esp32_examples" / "wheelie_bot" / ".pio",
-        project_root / "esp32_examples" / "speedie_bot" / ".pio",
-        project_root / "esp32_examples" / "bot_wifi_client" / ".pio",
-        project_root / "esp32_examples" / "esp_now_example" / ".pio",
-    ]
-    
+
     cleaned_count = 0
-    
-    # Clean directories
-    for dir_path in directories_to_clean:
-        if dir_path.exists():
+
+    # Deletes are I/O-bound, so overlap them on a small thread pool
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        futures = {
+            executor.submit(_remove, path, is_dir): path
+            for path, is_dir in _find_cleanup_targets(project_root)
+        }
+
+        for future in as_completed(futures):
+            path = futures[future]
             try:
-                shutil.rmtree(dir_path)
-                print(f"✅ Removed: {dir_path.relative_to(project_root)}")
+                future.result()
+                print(f"✅ Removed: {path.relative_to(project_root)}")
                 cleaned_count += 1
             except Exception as e:
-                print(f"❌ Could not remove {dir_path}: {e}")
-    
-    # Clean individual files
-    for pattern in cleanup_patterns:
-        if "*" in pattern:
-            # Handle glob patterns
-            for file_path in project_root.rglob(pattern):
-                if file_path.is_file():
-                    try:
-                        file_path.unlink()
-                        print(f"✅ Removed: {file_path.relative_to(project_root)}")
-                        cleaned_count += 1
-                    except Exception as e:
-                        print(f"❌ Could not remove {file_path}: {e}")
-    
+                print(f"❌ Could not remove {path}: {e}")
+
     print(f"\n🎉 Cleanup complete! Removed {cleaned_count} items.")
     print("📁 Project is now clean and ready for development.")
 
 if __name__ == "__main__":
-    cleanup_project()
\ No newline at end of file
+    cleanup_project()
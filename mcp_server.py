@@ -4,27 +4,124 @@ Monitors ESP-based bots via WiFi communication and provides real-time dashboard
 """
 
 import asyncio
+import hashlib
+import hmac
 import json
 import logging
 import os
+import queue
 from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+from logging.handlers import QueueHandler, QueueListener
 from socket import inet_aton
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Mapping, Optional, Set, Tuple, Union
 
+import orjson
 import uvicorn
-from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect, Security, Depends, UploadFile, File, Form
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect, Security, Depends, UploadFile, File, Form
+from fastapi.exceptions import RequestValidationError
 from fastapi.security import APIKeyHeader
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi.responses import HTMLResponse, FileResponse, ORJSONResponse, Response
 import socket
+import zlib
+from collections import ChainMap
 from zeroconf import ServiceInfo, Zeroconf
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr, ValidationError, model_validator
 
 from bot_manager import BotManager
 from database import DatabaseManager
 
+# WebSocket fan-out: a client that cannot take a frame within
+# BROADCAST_SEND_TIMEOUT seconds is dropped, and at most
+# BROADCAST_MAX_CONCURRENCY sends are in flight at once
+BROADCAST_SEND_TIMEOUT = 2.0
+BROADCAST_MAX_CONCURRENCY = 100
+
+# Larger audiences are sent to in slices of this many clients, yielding to
+# the event loop between slices so HTTP handlers can run mid-broadcast
+BROADCAST_BATCH_SIZE = 50
+
+# WebSocket messages larger than this many bytes are deflated once and sent
+# as binary frames, which the dashboard inflates; smaller ones go out as
+# plain JSON text. permessage-deflate is disabled so nothing is compressed
+# again per connection.
+WS_COMPRESS_THRESHOLD = 4096
+
+# How often the cached broadcast timestamp is refreshed, in seconds
+CLOCK_TICK_INTERVAL = 0.25
+
+# Firmware uploads are streamed to disk in chunks of this many bytes
+FIRMWARE_CHUNK_SIZE = 1 << 20
+
+
+def _encode_frame(message: bytes) -> Union[str, bytes]:
+    """Turn encoded JSON into a WebSocket frame payload, deflating large ones"""
+    if len(message) > WS_COMPRESS_THRESHOLD:
+        return zlib.compress(message, 1)
+    return message.decode()
+
+
+async def _send_frame(websocket: WebSocket, frame: Union[str, bytes]) -> None:
+    """Send a frame from _encode_frame as text or binary to match its type"""
+    if isinstance(frame, bytes):
+        await websocket.send_bytes(frame)
+    else:
+        await websocket.send_text(frame)
+
+
+async def _close_quietly(websocket: WebSocket) -> None:
+    """Close a WebSocket best-effort, ignoring errors from one already gone"""
+    try:
+        await asyncio.wait_for(websocket.close(), BROADCAST_SEND_TIMEOUT)
+    except Exception:
+        pass
+
+
+def _is_not_modified(request_headers: Mapping, response_headers: Mapping) -> bool:
+    """Whether a conditional GET can be answered with 304 Not Modified.
+
+    If-None-Match takes precedence: when present, If-Modified-Since is
+    ignored, as RFC 9110 requires.
+    """
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        etag = response_headers.get("etag")
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or (etag is not None and etag.removeprefix("W/") in tags)
+    
+    if_modified_since = request_headers.get("if-modified-since")
+    last_modified = response_headers.get("last-modified")
+    if if_modified_since is None or last_modified is None:
+        return False
+    try:
+        return parsedate_to_datetime(last_modified) <= parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+
+
+def _encode_free_form(field: str, value) -> Optional[str]:
+    """Encode a free-form payload field as compact JSON text.
+
+    Rejects values orjson cannot encode, such as integers beyond 64 bits, at
+    validation time, so a bad report never enters the bot registry and breaks
+    every later read. The text is kept for the database write to reuse.
+    """
+    if value is None:
+        return None
+    try:
+        return orjson.dumps(value).decode()
+    except orjson.JSONEncodeError as e:
+        raise ValueError(f"{field} is not JSON-encodable: {e}")
+
+
+# Range of an SQLite INTEGER; larger values validate as Python ints but fail
+# to bind when the batched write runs, long after the request returned
+SQLITE_INT_MIN = -(2 ** 63)
+SQLITE_INT_MAX = 2 ** 63 - 1
+
 
 # Data models for API
 class BotStatusData(BaseModel):
@@ -37,7 +134,16 @@ class BotStatusData(BaseModel):
     location: Optional[Dict[str, float]] = None
     sensor_data: Optional[Dict] = None
     esp_now_activity: Optional[List[Dict]] = None
-    uptime_seconds: Optional[int] = Field(None, ge=0)
+    uptime_seconds: Optional[int] = Field(None, ge=0, le=SQLITE_INT_MAX)
+
+    _sensor_data_json: Optional[str] = PrivateAttr(None)
+
+    @model_validator(mode="after")
+    def _encode_free_form_fields(self) -> "BotStatusData":
+        self._sensor_data_json = _encode_free_form("sensor_data", self.sensor_data)
+        # Never stored, only checked: the broadcast still has to encode it
+        _encode_free_form("esp_now_activity", self.esp_now_activity)
+        return self
 
 
 class ESPNowMessage(BaseModel):
@@ -46,39 +152,83 @@ class ESPNowMessage(BaseModel):
     message_type: str
     payload: Dict
     timestamp: Optional[datetime] = Field(default_factory=lambda: datetime.now(timezone.utc))
-    rssi: Optional[int] = None
+    rssi: Optional[int] = Field(None, ge=SQLITE_INT_MIN, le=SQLITE_INT_MAX)
+
+    _payload_json: Optional[str] = PrivateAttr(None)
+
+    @model_validator(mode="after")
+    def _encode_payload(self) -> "ESPNowMessage":
+        self._payload_json = _encode_free_form("payload", self.payload)
+        return self
 
 
 class MCPServer:
     def __init__(self, config_path: str = "config/config.json"):
+        self.logger = logging.getLogger(__name__)
         self.config = self._load_config(config_path)
-        self.app = FastAPI(title="Master Control Program", version="1.0.0")
+        self.app = FastAPI(
+            title="Master Control Program",
+            version="1.0.0",
+            default_response_class=ORJSONResponse
+        )
         self.bot_manager = BotManager(self.config)
         self.db_manager = DatabaseManager(self.config["database"]["path"])
-        self.websocket_connections: List[WebSocket] = []
+        self.websocket_connections: Set[WebSocket] = set()
+        
+        # Config tunables, read once here rather than on every request or
+        # loop iteration
+        security_config = self.config.get("security") or {}
+        monitoring_config = self.config.get("monitoring") or {}
+        api_key = security_config.get("api_key")
+        self._api_key: Optional[bytes] = api_key.encode() if api_key else None
+        self._api_key_required = bool(security_config.get("api_key_required", False))
+        self._cors_enabled = security_config.get("enable_cors", True)
+        self._health_interval = monitoring_config.get("health_check_interval_seconds", 10)
+        self._retention_days = monitoring_config.get("data_retention_days", 30)
+        
+        # Created on startup so it binds to the server's event loop
+        self._broadcast_semaphore: Optional[asyncio.Semaphore] = None
+        # Encoded initial_data frame for new dashboards; reset to None
+        # whenever a bot is added, changed or removed
+        self._initial_data_cache: Optional[Union[str, bytes]] = None
+        # UTC ISO timestamp stamped on broadcasts, refreshed by _clock_tick
+        self._now_iso = datetime.now(timezone.utc).isoformat()
         self.zeroconf = None
         self.firmware_dir = Path("data/firmware")
         self.firmware_version_file = self.firmware_dir / "version.json"
+        # (mtime_ns, encoded body, parsed info) of version.json, re-read only
+        # when it changes
+        self._firmware_version_cache: Optional[Tuple[int, bytes, Dict]] = None
         self.service_info = None
+        self._log_listener: Optional[QueueListener] = None
+        # Resolved once by _get_local_ip
+        self._local_ip: Optional[str] = None
         
         self._setup_logging()
         self._setup_middleware()
         self._setup_routes()
         
-        self.logger = logging.getLogger(__name__)
         self.logger.info("MCP Server initialized")
 
-    def _load_config(self, config_path: str) -> Dict:
-        """Load configuration from JSON file"""
+    def _load_config(self, config_path: str) -> Mapping:
+        """Load configuration from JSON file, layered over the defaults"""
+        defaults = self._default_config()
         try:
-            with open(config_path, 'r') as f:
-                return json.load(f)
+            loaded = orjson.loads(Path(config_path).read_bytes())
         except FileNotFoundError:
             self.logger.error(f"Config file not found: {config_path}")
-            return self._default_config()
-        except json.JSONDecodeError as e:
+            return defaults
+        except orjson.JSONDecodeError as e:
             self.logger.error(f"Invalid JSON in config file: {e}")
-            return self._default_config()
+            return defaults
+        
+        # A partial config inherits whatever it leaves out, whole sections or
+        # single settings, from the defaults
+        return ChainMap({
+            section: ChainMap(values, defaults[section])
+            if isinstance(values, dict) and section in defaults else values
+            for section, values in loaded.items()
+        }, defaults)
 
     def _default_config(self) -> Dict:
         """Return default configuration"""
@@ -103,23 +253,32 @@ class MCPServer:
         # Setup root logger
         logger = logging.getLogger()
         logger.setLevel(level)
+        handlers = []
         
         # Console handler
         if log_config.get("console_enabled", True):
             console_handler = logging.StreamHandler()
             console_handler.setFormatter(formatter)
-            logger.addHandler(console_handler)
+            handlers.append(console_handler)
         
         # File handler
         if log_config.get("file_enabled", True):
             os.makedirs("data/logs", exist_ok=True)
             file_handler = logging.FileHandler("data/logs/mcp.log")
             file_handler.setFormatter(formatter)
-            logger.addHandler(file_handler)
+            handlers.append(file_handler)
+        
+        # The root logger only enqueues records; a listener thread does the
+        # console and file writes, so logging never blocks the event loop
+        if handlers:
+            log_queue = queue.Queue(-1)
+            logger.addHandler(QueueHandler(log_queue))
+            self._log_listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+            self._log_listener.start()
 
     def _setup_middleware(self):
         """Setup FastAPI middleware"""
-        if self.config.get("security", {}).get("enable_cors", True):
+        if self._cors_enabled:
             self.app.add_middleware(
                 CORSMiddleware,
                 allow_origins=["*"],  # Allow all origins for local network access
@@ -134,9 +293,15 @@ class MCPServer:
             await self.start_background_tasks()
 
         @self.app.on_event("shutdown")
-        def shutdown_event():
+        async def shutdown_event():
             self.logger.info("Shutting down mDNS service.")
             self._unregister_mdns_service()
+            await self.db_manager.close()
+            
+            # Drain queued log records to their handlers
+            if self._log_listener is not None:
+                self._log_listener.stop()
+                self._log_listener = None
 
     def _setup_routes(self):
         """Setup API routes"""
@@ -146,14 +311,14 @@ class MCPServer:
 
         async def verify_api_key(api_key: str = Security(api_key_header)):
             """Verify the provided API key against the server configuration."""
-            expected_api_key = self.config.get("security", {}).get("api_key")
-            api_key_required = self.config.get("security", {}).get("api_key_required", False)
-            
             # If API key is not required, allow the request.
-            if not api_key_required:
+            if not self._api_key_required:
                 return
 
-            if not api_key or api_key != expected_api_key:
+            # Constant-time comparison so response timing leaks nothing about
+            # how much of the key matched
+            expected_api_key = self._api_key
+            if not api_key or expected_api_key is None or not hmac.compare_digest(api_key.encode(), expected_api_key):
                 self.logger.warning(f"Unauthorized API access attempt with key: {api_key}")
                 raise HTTPException(status_code=401, detail="Invalid or missing API Key")
         
@@ -161,9 +326,8 @@ class MCPServer:
         if os.path.exists("web_dashboard"):
             self.app.mount("/static", StaticFiles(directory="web_dashboard/static"), name="static")
         
-        # Mount firmware directory for OTA downloads
+        # Firmware directory for OTA downloads, served by download_firmware
         self.firmware_dir.mkdir(exist_ok=True)
-        self.app.mount("/firmware", StaticFiles(directory=self.firmware_dir), name="firmware")
 
 
         @self.app.get("/", response_class=HTMLResponse)
@@ -178,17 +342,44 @@ class MCPServer:
                     "Please ensure web_dashboard/index.html exists.</p>"
                 )
 
-        @self.app.post("/api/bot/status", dependencies=[Depends(verify_api_key)])
-        async def receive_bot_status(data: BotStatusData):
+        async def parse_body(request: Request, model):
+            """Validate a JSON request body straight from its raw bytes.
+
+            pydantic-core parses and validates in one pass, skipping the
+            intermediate dict FastAPI's body binding would build first.
+            """
+            try:
+                return model.model_validate_json(await request.body())
+            except ValidationError as e:
+                # Match FastAPI's own body errors, whose locations start at "body"
+                raise RequestValidationError([
+                    {**error, "loc": ("body", *error["loc"])} for error in e.errors()
+                ])
+
+        def body_schema(model) -> Dict:
+            """OpenAPI requestBody for a handler that validates via parse_body"""
+            return {"requestBody": {
+                "required": True,
+                "content": {"application/json": {"schema": model.model_json_schema()}}
+            }}
+
+        @self.app.post(
+            "/api/bot/status",
+            dependencies=[Depends(verify_api_key)],
+            openapi_extra=body_schema(BotStatusData)
+        )
+        async def receive_bot_status(request: Request):
             """Receive status update from a bot"""
+            data = await parse_body(request, BotStatusData)
             try:
                 self.logger.info(f"Received status from bot {data.bot_id}")
                 
                 # Update bot in manager
                 await self.bot_manager.update_bot_status(data)
+                self._initial_data_cache = None
                 
                 # Store in database
-                await self.db_manager.store_bot_status(data)
+                await self.db_manager.store_bot_status(data, data._sensor_data_json)
                 
                 # Broadcast to connected WebSocket clients
                 await self._broadcast_bot_update(data)
@@ -199,14 +390,19 @@ class MCPServer:
                 self.logger.error(f"Error processing bot status: {e}")
                 raise HTTPException(status_code=500, detail=str(e))
 
-        @self.app.post("/api/esp-now/message", dependencies=[Depends(verify_api_key)])
-        async def receive_esp_now_message(data: ESPNowMessage):
+        @self.app.post(
+            "/api/esp-now/message",
+            dependencies=[Depends(verify_api_key)],
+            openapi_extra=body_schema(ESPNowMessage)
+        )
+        async def receive_esp_now_message(request: Request):
             """Receive ESP-NOW message report from a bot"""
+            data = await parse_body(request, ESPNowMessage)
             try:
                 self.logger.debug(f"ESP-NOW: {data.sender_mac} -> {data.receiver_mac}")
                 
                 # Store ESP-NOW activity
-                await self.db_manager.store_esp_now_message(data)
+                await self.db_manager.store_esp_now_message(data, data._payload_json)
                 
                 # Broadcast to dashboard
                 await self._broadcast_esp_now_activity(data)
@@ -217,17 +413,19 @@ class MCPServer:
                 self.logger.error(f"Error processing ESP-NOW message: {e}")
                 raise HTTPException(status_code=500, detail=str(e))
 
-        @self.app.get("/api/bots")
+        # Read endpoints return a ready-made ORJSONResponse, which FastAPI
+        # passes through without jsonable_encoder or response validation
+        @self.app.get("/api/bots", response_model=None)
         async def get_all_bots():
             """Get status of all registered bots"""
             try:
                 bots = await self.bot_manager.get_all_bots()
-                return {"bots": bots, "count": len(bots)}
+                return ORJSONResponse(content={"bots": bots, "count": len(bots)})
             except Exception as e:
                 self.logger.error(f"Error getting bots: {e}")
                 raise HTTPException(status_code=500, detail=str(e))
 
-        @self.app.get("/api/bots/{bot_id}")
+        @self.app.get("/api/bots/{bot_id}", response_model=None)
         async def get_bot_details(bot_id: str):
             """Get detailed information about a specific bot"""
             try:
@@ -235,10 +433,15 @@ class MCPServer:
                 if not bot:
                     raise HTTPException(status_code=404, detail="Bot not found")
                 
-                # Get recent activity from database
-                history = await self.db_manager.get_bot_history(bot_id, limit=50)
+                # Get recent activity from database as SQLite-built JSON text,
+                # spliced into the response as-is rather than decoded and
+                # re-encoded
+                history = await self.db_manager.get_bot_history_json(bot_id, limit=50)
                 
-                return {"bot": bot, "history": history}
+                return Response(
+                    content=b'{"bot":' + orjson.dumps(bot.to_dict()) + b',"history":' + history.encode() + b"}",
+                    media_type="application/json"
+                )
             except HTTPException:
                 raise
             except Exception as e:
@@ -256,6 +459,7 @@ class MCPServer:
                 success = await self.bot_manager.update_bot_name(bot_id, new_name)
                 if not success:
                     raise HTTPException(status_code=404, detail="Bot not found")
+                self._initial_data_cache = None
                 
                 self.logger.info(f"Bot {bot_id} renamed to: {new_name}")
                 
@@ -278,6 +482,8 @@ class MCPServer:
             """Remove bots that have been inactive for specified time"""
             try:
                 removed_count = await self.bot_manager.remove_inactive_bots(max_inactive_minutes)
+                if removed_count:
+                    self._initial_data_cache = None
                 
                 self.logger.info(f"Cleaned up {removed_count} inactive bots")
                 
@@ -301,28 +507,61 @@ class MCPServer:
                 self.logger.error(f"Error getting bot details: {e}")
                 raise HTTPException(status_code=500, detail=str(e))
 
-        @self.app.get("/api/esp-now/activity")
+        @self.app.get("/api/esp-now/activity", response_model=None)
         async def get_esp_now_activity(limit: int = 100):
             """Get recent ESP-NOW activity"""
             try:
                 activity = await self.db_manager.get_esp_now_activity(limit=limit)
-                return {"activity": activity, "count": len(activity)}
+                return ORJSONResponse(content={"activity": activity, "count": len(activity)})
             except Exception as e:
                 self.logger.error(f"Error getting ESP-NOW activity: {e}")
                 raise HTTPException(status_code=500, detail=str(e))
 
-        @self.app.get("/api/firmware/latest")
+        @self.app.get("/api/firmware/latest", response_model=None)
         async def get_latest_firmware_version():
             """Get metadata for the latest available firmware."""
-            if not self.firmware_version_file.exists():
-                raise HTTPException(status_code=404, detail="No firmware version information available.")
             try:
-                with open(self.firmware_version_file, 'r') as f:
-                    version_info = json.load(f)
-                return version_info
+                _, body, _ = self._firmware_version()
+            except FileNotFoundError:
+                raise HTTPException(status_code=404, detail="No firmware version information available.")
             except Exception as e:
                 self.logger.error(f"Error reading firmware version file: {e}")
                 raise HTTPException(status_code=500, detail="Could not retrieve firmware information.")
+            return Response(content=body, media_type="application/json")
+
+        @self.app.get("/firmware/{filename}")
+        @self.app.head("/firmware/{filename}")
+        async def download_firmware(filename: str, request: Request):
+            """Serve a firmware file for OTA download."""
+            file_path = self.firmware_dir / filename
+            if Path(filename).name != filename or not file_path.is_file():
+                raise HTTPException(status_code=404, detail="Not Found")
+            
+            # The current image is tagged with its upload SHA-256; every other
+            # file keeps FileResponse's stat-based ETag and Last-Modified
+            headers = {}
+            try:
+                info = self._firmware_version()[2]
+            except (FileNotFoundError, ValueError):
+                info = {}
+            if info.get("filename") == filename and info.get("sha256"):
+                headers["etag"] = f'"{info["sha256"]}"'
+            
+            # FileResponse streams via sendfile where the server supports it
+            response = FileResponse(
+                file_path,
+                media_type="application/octet-stream",
+                headers=headers,
+                stat_result=file_path.stat()
+            )
+            
+            # Bots polling for an image they already hold get a 304 instead
+            # of the whole file
+            if _is_not_modified(request.headers, response.headers):
+                return Response(status_code=304, headers={
+                    name: response.headers[name] for name in ("etag", "last-modified")
+                })
+            return response
 
         @self.app.post("/api/firmware/upload", dependencies=[Depends(verify_api_key)])
         async def upload_firmware(
@@ -335,20 +574,33 @@ class MCPServer:
                 raise HTTPException(status_code=400, detail="Invalid file type. Only .bin files are allowed.")
 
             try:
-                # Save the binary file
+                # Stream the binary to disk chunk by chunk, hashing as it goes,
+                # so memory stays flat whatever the firmware size
                 file_path = self.firmware_dir / file.filename
+                loop = asyncio.get_running_loop()
+                sha256 = hashlib.sha256()
+                size = 0
                 with open(file_path, "wb") as buffer:
-                    buffer.write(await file.read())
+                    while True:
+                        chunk = await file.read(FIRMWARE_CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        sha256.update(chunk)
+                        size += len(chunk)
+                        await loop.run_in_executor(None, buffer.write, chunk)
                 
                 # Update the version info file
                 version_info = {
                     "version": version,
                     "filename": file.filename,
                     "notes": notes,
+                    "size": size,
+                    "sha256": sha256.hexdigest(),
                     "upload_timestamp": datetime.now(timezone.utc).isoformat()
                 }
                 with open(self.firmware_version_file, 'w') as f:
                     json.dump(version_info, f, indent=2)
+                self._firmware_version_cache = None
 
                 self.logger.info(f"New firmware uploaded: {file.filename} (Version: {version})")
                 
@@ -364,112 +616,142 @@ class MCPServer:
         async def websocket_endpoint(websocket: WebSocket):
             """WebSocket endpoint for real-time updates"""
             await websocket.accept()
-            self.websocket_connections.append(websocket)
+            self.websocket_connections.add(websocket)
             self.logger.info("New WebSocket connection established")
             
             try:
-                # Send initial data
-                bots = await self.bot_manager.get_all_bots()
-                await websocket.send_json({
-                    "type": "initial_data",
-                    "bots": bots
-                })
+                # Send initial data, encoded once and shared by every
+                # dashboard that connects before the next bot change
+                if self._initial_data_cache is None:
+                    bots_json = await self.bot_manager.get_all_bots_json()
+                    self._initial_data_cache = _encode_frame(b'{"type":"initial_data","bots":' + bots_json + b"}")
+                await _send_frame(websocket, self._initial_data_cache)
                 
-                # Keep connection alive
+                # Park on receive until the client goes away; liveness is
+                # covered by uvicorn's protocol-level pings (ws_ping_interval)
                 while True:
-                    # Send periodic heartbeat/updates
-                    await asyncio.sleep(5)
-                    await websocket.send_json({
-                        "type": "heartbeat",
-                        "timestamp": datetime.now(timezone.utc).isoformat()
-                    })
+                    await websocket.receive_text()
                     
             except WebSocketDisconnect:
-                if websocket in self.websocket_connections:
-                    self.websocket_connections.remove(websocket)
+                self.websocket_connections.discard(websocket)
                 self.logger.info("WebSocket connection closed")
             except Exception as e:
                 self.logger.error(f"WebSocket error: {e}")
-                if websocket in self.websocket_connections:
-                    self.websocket_connections.remove(websocket)
+                self.websocket_connections.discard(websocket)
+                # Close so the dashboard's onclose reconnect runs instead of
+                # leaving it waiting on a socket nobody serves
+                await _close_quietly(websocket)
+
+    def _firmware_version(self) -> Tuple[int, bytes, Dict]:
+        """Return (mtime_ns, encoded body, info) for version.json.
+
+        Costs a stat per call; the file is only re-read after it changes.
+        Raises FileNotFoundError when no firmware has been uploaded.
+        """
+        mtime = self.firmware_version_file.stat().st_mtime_ns
+        cache = self._firmware_version_cache
+        if cache is None or cache[0] != mtime:
+            with open(self.firmware_version_file, 'rb') as f:
+                info = orjson.loads(f.read())
+            cache = (mtime, orjson.dumps(info), info)
+            self._firmware_version_cache = cache
+        return cache
 
     async def _broadcast_bot_update(self, bot_data: BotStatusData):
         """Broadcast bot status update to all WebSocket connections"""
         if not self.websocket_connections:
             return
             
-        message = {
+        await self.broadcast_to_websockets({
             "type": "bot_update",
             "bot_id": bot_data.bot_id,
             "data": bot_data.dict(),
-            "timestamp": datetime.now(timezone.utc).isoformat()
-        }
-        
-        # Remove disconnected connections
-        active_connections = []
-        for websocket in self.websocket_connections:
-            try:
-                await websocket.send_json(message)
-                active_connections.append(websocket)
-            except:
-                self.logger.debug("Removed disconnected WebSocket")
-                
-        self.websocket_connections = active_connections
+            "timestamp": self._now_iso
+        })
 
     async def _broadcast_esp_now_activity(self, esp_now_data: ESPNowMessage):
         """Broadcast ESP-NOW activity to all WebSocket connections"""
         if not self.websocket_connections:
             return
             
-        message = {
+        await self.broadcast_to_websockets({
             "type": "esp_now_activity",
             "data": esp_now_data.dict(),
-            "timestamp": datetime.now(timezone.utc).isoformat()
-        }
-        
-        # Remove disconnected connections
-        active_connections = []
-        for websocket in self.websocket_connections:
-            try:
-                await websocket.send_json(message)
-                active_connections.append(websocket)
-            except:
-                self.logger.debug("Removed disconnected WebSocket")
-                
-        self.websocket_connections = active_connections
+            "timestamp": self._now_iso
+        })
 
     async def broadcast_to_websockets(self, message: dict):
         """Broadcast a message to all WebSocket connections"""
         if not self.websocket_connections:
             return
-            
-        # Remove disconnected connections
-        active_connections = []
-        for websocket in self.websocket_connections:
+        
+        await self._broadcast_raw(_encode_frame(orjson.dumps(message)))
+
+    async def _broadcast_raw(self, payload: Union[str, bytes]):
+        """Send an already-encoded message to every WebSocket connection"""
+        semaphore = self._broadcast_semaphore
+        
+        async def send(websocket: WebSocket) -> bool:
             try:
-                await websocket.send_json(message)
-                active_connections.append(websocket)
-            except:
-                self.logger.debug("Removed disconnected WebSocket")
-                
-        self.websocket_connections = active_connections
+                async with semaphore:
+                    await asyncio.wait_for(_send_frame(websocket, payload), BROADCAST_SEND_TIMEOUT)
+                return True
+            except Exception:
+                return False
+        
+        # Send to every client concurrently so one slow socket only delays
+        # itself, not everyone queued behind it
+        connections = list(self.websocket_connections)
+        if len(connections) <= BROADCAST_BATCH_SIZE:
+            results = await asyncio.gather(*(send(ws) for ws in connections))
+        else:
+            results = []
+            for start in range(0, len(connections), BROADCAST_BATCH_SIZE):
+                batch = connections[start:start + BROADCAST_BATCH_SIZE]
+                results.extend(await asyncio.gather(*(send(ws) for ws in batch)))
+                await asyncio.sleep(0)
+        dead = [ws for ws, ok in zip(connections, results) if not ok]
+        
+        # Remove disconnected and stalled connections, closing them so a live
+        # but slow dashboard notices and reconnects rather than silently
+        # missing updates (a timed-out send may also have left a partial frame)
+        if dead:
+            self.logger.debug(f"Removed {len(dead)} disconnected WebSocket(s)")
+            self.websocket_connections.difference_update(dead)
+            await asyncio.gather(*(_close_quietly(ws) for ws in dead))
 
     async def start_background_tasks(self):
         """Start background monitoring tasks"""
         self.logger.info("Starting background tasks")
         
+        self._broadcast_semaphore = asyncio.Semaphore(BROADCAST_MAX_CONCURRENCY)
+        
         # Initialize database
         await self.db_manager.initialize()
         
+        # Keep the broadcast timestamp current
+        asyncio.create_task(self._clock_tick())
+        
         # Start health monitoring
         asyncio.create_task(self._health_monitor())
         
         # Start cleanup task
         asyncio.create_task(self._cleanup_task())
 
+    async def _clock_tick(self):
+        """Refresh the cached broadcast timestamp.
+
+        Broadcasts read self._now_iso instead of formatting
+        a fresh datetime per message; CLOCK_TICK_INTERVAL of drift is fine
+        for dashboard display. POST handlers still take exact times.
+        """
+        while True:
+            self._now_iso = datetime.now(timezone.utc).isoformat()
+            await asyncio.sleep(CLOCK_TICK_INTERVAL)
+
     async def _health_monitor(self):
         """Monitor bot health and detect timeouts"""
-        interval = self.config.get("monitoring", {}).get("health_check_interval_seconds", 10)
+        interval = self._health_interval
         
         while True:
             try:
@@ -479,13 +761,17 @@ class MCPServer:
                 inactive_bots = await self.bot_manager.check_bot_health()
                 
                 if inactive_bots:
+                    self._initial_data_cache = None
                     self.logger.warning(f"Detected {len(inactive_bots)} inactive bots")
                     
                     # Broadcast health updates
+                    # Trusted source: these updates are built here from IDs the
+                    # bot manager already holds, so field validation is skipped
                     for bot_id in inactive_bots:
-                        await self._broadcast_bot_update(BotStatusData(
+                        await self._broadcast_bot_update(BotStatusData.model_construct(
                             bot_id=bot_id,
-                            status="inactive"
+                            status="inactive",
+                            timestamp=datetime.now(timezone.utc)
                         ))
                         
             except Exception as e:
@@ -498,7 +784,7 @@ class MCPServer:
                 # Run cleanup every hour
                 await asyncio.sleep(3600)
                 
-                retention_days = self.config.get("monitoring", {}).get("data_retention_days", 30)
+                retention_days = self._retention_days
                 cutoff_date = datetime.now(timezone.utc) - timedelta(days=retention_days)
                 
                 await self.db_manager.cleanup_old_data(cutoff_date)
@@ -533,18 +819,30 @@ class MCPServer:
             self.zeroconf.close()
 
     def _get_local_ip(self) -> str:
-        """Get the local IP address of the machine."""
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        """Get the local IP address of the machine, resolved once and cached."""
+        if self._local_ip is None:
+            self._local_ip = self._resolve_local_ip()
+        return self._local_ip
+
+    def _resolve_local_ip(self) -> str:
+        # Prefer what the hostname resolves to, skipping loopback entries
+        # such as Debian's 127.0.1.1
+        try:
+            for *_, sockaddr in socket.getaddrinfo(socket.gethostname(), None, socket.AF_INET):
+                if not sockaddr[0].startswith("127."):
+                    return sockaddr[0]
+        except OSError:
+            pass
+        
+        # Otherwise ask which source address the default route would use
         try:
-            # Doesn't have to be reachable
-            s.connect(('10.255.255.255', 1))
-            ip = s.getsockname()[0]
-        except Exception:
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+                # Doesn't have to be reachable
+                s.connect(('10.255.255.255', 1))
+                return s.getsockname()[0]
+        except OSError:
             self.logger.warning("Could not determine local IP. Defaulting to 127.0.0.1")
-            ip = '127.0.0.1'
-        finally:
-            s.close()
-        return ip
+            return '127.0.0.1'
 
     def run(self):
         """Start the MCP server"""
@@ -552,6 +850,7 @@ class MCPServer:
         host = server_config.get("host", "0.0.0.0")
         port = server_config.get("port", 8080)
         debug = server_config.get("debug", False)
+        workers = server_config.get("workers", 1)
         
         self.logger.info(f"Starting MCP Server on {host}:{port}")
         
@@ -560,10 +859,24 @@ class MCPServer:
         self.logger.info(f"Advertising mDNS service on IP: {local_ip}")
         self._register_mdns_service(local_ip, port)
 
+        # Bot state, WebSocket clients and the background tasks all live in
+        # this process, so it must stay the only worker
+        if workers != 1:
+            self.logger.warning(f"Ignoring server.workers={workers}; the MCP server runs as a single worker")
+        
+        # "auto" picks uvloop and httptools when installed (uvicorn[standard])
+        # and falls back to asyncio/h11 where they are not, e.g. on Windows
         uvicorn.run(
             self.app,
             host=host,
             port=port,
+            loop="auto",
+            http="auto",
+            timeout_keep_alive=server_config.get("timeout_keep_alive", 30),
+            limit_concurrency=server_config.get("limit_concurrency", 1000),
+            ws_ping_interval=20,
+            ws_ping_timeout=20,
+            ws_per_message_deflate=False,
             log_level="debug" if debug else "info"
         )
 
@@ -0,0 +1,77 @@
+"""
+API tests for firmware downloads (requires httpx for FastAPI's TestClient)
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi.testclient import TestClient
+
+from mcp_server import MCPServer
+
+
+class FirmwareConditionalGetTests(unittest.TestCase):
+    """Conditional GETs get a 304 for the current image and for older files"""
+
+    def setUp(self):
+        # The server keeps its database, logs and firmware under the working directory
+        self._cwd = os.getcwd()
+        self._tmp = tempfile.TemporaryDirectory()
+        os.chdir(self._tmp.name)
+        self.server = MCPServer(config_path="missing.json")
+
+    def tearDown(self):
+        os.chdir(self._cwd)
+        self._tmp.cleanup()
+
+    def test_current_image_uses_upload_sha256(self):
+        with TestClient(self.server.app) as client:
+            client.post(
+                "/api/firmware/upload",
+                data={"version": "1.0"},
+                files={"file": ("current.bin", b"\x01" * 1024)}
+            )
+            sha256 = client.get("/api/firmware/latest").json()["sha256"]
+
+            response = client.get("/firmware/current.bin", headers={"if-none-match": f'"{sha256}"'})
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response.headers["etag"], f'"{sha256}"')
+
+    def test_other_file_honours_if_none_match(self):
+        with TestClient(self.server.app) as client:
+            (self.server.firmware_dir / "old.bin").write_bytes(b"\x02" * 1024)
+
+            response = client.get("/firmware/old.bin")
+            self.assertEqual(response.status_code, 200)
+            etag = response.headers["etag"]
+
+            response = client.get("/firmware/old.bin", headers={"if-none-match": etag})
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response.content, b"")
+
+            response = client.get("/firmware/old.bin", headers={"if-none-match": '"stale"'})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.content), 1024)
+
+    def test_other_file_honours_if_modified_since(self):
+        with TestClient(self.server.app) as client:
+            (self.server.firmware_dir / "old.bin").write_bytes(b"\x02" * 1024)
+            last_modified = client.get("/firmware/old.bin").headers["last-modified"]
+
+            response = client.get("/firmware/old.bin", headers={"if-modified-since": last_modified})
+            self.assertEqual(response.status_code, 304)
+
+            response = client.get(
+                "/firmware/old.bin",
+                headers={"if-modified-since": "Thu, 01 Jan 1970 00:00:00 GMT"}
+            )
+            self.assertEqual(response.status_code, 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+"""
+API tests for the telemetry endpoints (requires httpx for FastAPI's TestClient)
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi.testclient import TestClient
+
+from mcp_server import MCPServer
+
+
+class TelemetryTimestampTests(unittest.TestCase):
+    """A null timestamp is stored as the arrival time instead of failing the request"""
+
+    def setUp(self):
+        # The server keeps its database, logs and firmware under the working directory
+        self._cwd = os.getcwd()
+        self._tmp = tempfile.TemporaryDirectory()
+        os.chdir(self._tmp.name)
+        self.server = MCPServer(config_path="missing.json")
+
+    def tearDown(self):
+        os.chdir(self._cwd)
+        self._tmp.cleanup()
+
+    def _stored_timestamps(self, table: str):
+        with sqlite3.connect(self.server.db_manager.db_path) as conn:
+            return [row[0] for row in conn.execute(f"SELECT timestamp FROM {table}")]
+
+    def test_bot_status_with_null_timestamp(self):
+        with TestClient(self.server.app) as client:
+            response = client.post(
+                "/api/bot/status",
+                json={"bot_id": "bot-1", "status": "online", "timestamp": None}
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertIn("bot-1", self.server.bot_manager.bots)
+
+        timestamps = self._stored_timestamps("bot_status")
+        self.assertEqual(len(timestamps), 1)
+        self.assertIsInstance(timestamps[0], int)
+
+    def test_esp_now_message_with_null_timestamp(self):
+        with TestClient(self.server.app) as client:
+            response = client.post(
+                "/api/esp-now/message",
+                json={
+                    "sender_mac": "AA:BB:CC:DD:EE:01",
+                    "receiver_mac": "AA:BB:CC:DD:EE:02",
+                    "message_type": "heartbeat",
+                    "payload": {},
+                    "timestamp": None
+                }
+            )
+            self.assertEqual(response.status_code, 200)
+
+        timestamps = self._stored_timestamps("esp_now_messages")
+        self.assertEqual(len(timestamps), 1)
+        self.assertIsInstance(timestamps[0], int)
+
+
+if __name__ == "__main__":
+    unittest.main()
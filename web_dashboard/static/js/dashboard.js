@@ -26,6 +26,7 @@ class MCPDashboard {
         const wsUrl = `${protocol}//${window.location.host}/ws`;
         
         this.ws = new WebSocket(wsUrl);
+        this.messageChain = Promise.resolve();
         
         this.ws.onopen = () => {
             console.log('WebSocket connected');
@@ -34,8 +35,12 @@ class MCPDashboard {
         };
         
         this.ws.onmessage = (event) => {
-            const data = JSON.parse(event.data);
-            this.handleWebSocketMessage(data);
+            // Decoding a compressed frame is async, so chain messages to
+            // keep handling them in arrival order
+            this.messageChain = this.messageChain
+                .then(() => this.decodeWebSocketMessage(event.data))
+                .then((data) => this.handleWebSocketMessage(data))
+                .catch((error) => console.error('WebSocket message error:', error));
         };
         
         this.ws.onclose = () => {
@@ -52,6 +57,15 @@ class MCPDashboard {
         };
     }
 
+    async decodeWebSocketMessage(raw) {
+        // Large messages arrive as deflate-compressed binary frames
+        if (typeof raw === 'string') {
+            return JSON.parse(raw);
+        }
+        const stream = raw.stream().pipeThrough(new DecompressionStream('deflate'));
+        return JSON.parse(await new Response(stream).text());
+    }
+
     handleWebSocketMessage(data) {
         switch (data.type) {
             case 'initial_data':
@@ -76,10 +90,6 @@ class MCPDashboard {
                 this.handleESPNowActivity(data);
                 break;
                 
-            case 'heartbeat':
-                // Just acknowledge the heartbeat
-                break;
-                
             default:
                 console.log('Unknown message type:', data.type);
         }